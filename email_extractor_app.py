@@ -1,88 +1,137 @@
+import hashlib
 import os
-import re
+import threading
 import pandas as pd
 import streamlit as st
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
-from docx import Document
-import PyPDF2
-import mammoth
+from extraction import extract_one
+
+# Number of per-file extraction results kept between reruns.
+RESULT_CACHE_SIZE = 256
+
+# Number of most recent log lines shown while extracting.
+LOG_LINES = 200
+
+def _worker_count():
+    """Return the number of CPUs this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # sched_getaffinity is not available on macOS or Windows.
+        return os.cpu_count() or 1
+
+@st.cache_resource
+def _executor():
+    """Return the process pool shared by all reruns and sessions.
+
+    Building a pool per extraction means every worker re-imports pandas and
+    PyMuPDF under the spawn start method, and concurrent sessions would each
+    start a full set of workers.
+    """
+    return ProcessPoolExecutor(max_workers=_worker_count())
+
+def _discard_executor(executor):
+    """Drop a broken shared pool so the next call builds a fresh one."""
+    if _executor() is executor:
+        _executor.clear()
+
+@st.cache_resource
+def _result_cache():
+    """Return the per-file results shared across reruns and sessions.
+
+    Entries map (filename, sha1 of the contents) to the (emails, logs,
+    failed) result of extract_one and are kept in insertion order so the
+    oldest can be evicted once RESULT_CACHE_SIZE is exceeded. Sessions run in
+    separate threads, so the dict is returned with the lock guarding it.
+    """
+    return {}, threading.Lock()
 
 def extract_emails_from_files(files):
-    email_set = set()
-    email_pattern = re.compile(
-        r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-z]{2,}', re.IGNORECASE)
+    # One frozenset per file, merged in a single union at the end.
+    found = []
+
+    uploads = {}
+    for uploaded_file in files:
+        data = uploaded_file.getvalue()
+        uploads[(uploaded_file.name, hashlib.sha1(data).hexdigest())] = data
 
-    total_files = len(files)
+    total_files = len(uploads)
     progress_bar = st.progress(0)
     log_area = st.empty()
-    logs = []
+    logs = deque(maxlen=LOG_LINES)
+    processed = 0
 
-    for idx, uploaded_file in enumerate(files):
-        filename = uploaded_file.name
-        file_extension = os.path.splitext(filename)[1].lower()
-        logs.append(f"Processing file {idx + 1}/{total_files}: **{filename}**")
+    def record(key, result):
+        nonlocal processed
+        processed += 1
+        emails, file_logs, _ = result
+        found.append(emails)
+        logs.append(f"Processed file {processed}/{total_files}: **{key[0]}**")
+        logs.extend(file_logs)
         log_area.markdown("\n".join(logs))
+        progress_bar.progress(processed / total_files)
+
+    # Files already seen with identical contents are not parsed again.
+    cache, cache_lock = _result_cache()
+    pending = []
+    for key in uploads:
+        with cache_lock:
+            result = cache.get(key)
+        if result is None:
+            pending.append(key)
+        else:
+            record(key, result)
+
+    def store(key, result):
+        # Failures may be transient (e.g. MemoryError), so only clean
+        # results are kept.
+        _, _, failed = result
+        if not failed:
+            with cache_lock:
+                cache[key] = result
+                while len(cache) > RESULT_CACHE_SIZE:
+                    cache.pop(next(iter(cache)))
+        record(key, result)
+
+    if pending:
+        # Files are independent, so parse them in separate processes. The
+        # UploadedFile objects cannot be pickled; the workers get raw bytes.
+        # Even a single file goes to the pool: a native crash or OOM kill
+        # in PyMuPDF or calamine then takes down a worker, not the server,
+        # and PyMuPDF is never run on several session threads at once.
+        def submit(executor):
+            return {
+                executor.submit(extract_one, key[0], uploads[key]): key
+                for key in pending
+            }
+
+        executor = _executor()
         try:
-            if file_extension in ['.xls', '.xlsx', '.xlsm']:
-                # Determine the engine based on file extension
-                if file_extension == '.xls':
-                    engine = 'xlrd'
-                else:
-                    engine = 'openpyxl'
-                xls = pd.ExcelFile(uploaded_file, engine=engine)
-                for sheet_name in xls.sheet_names:
-                    logs.append(f"Reading sheet: {sheet_name}")
-                    log_area.markdown("\n".join(logs))
-                    df = pd.read_excel(
-                        xls, sheet_name=sheet_name, dtype=str, engine=engine)
-                    for column in df.columns:
-                        for cell in df[column].dropna():
-                            matches = email_pattern.findall(str(cell))
-                            for email in matches:
-                                email_set.add(email)
-            elif file_extension == '.docx':
-                doc = Document(uploaded_file)
-                logs.append(f"Extracting text from Word (.docx) document")
-                log_area.markdown("\n".join(logs))
-                for para in doc.paragraphs:
-                    matches = email_pattern.findall(para.text)
-                    for email in matches:
-                        email_set.add(email)
-                for table in doc.tables:
-                    for row in table.rows:
-                        for cell in row.cells:
-                            matches = email_pattern.findall(cell.text)
-                            for email in matches:
-                                email_set.add(email)
-            elif file_extension == '.doc':
-                logs.append(f"Extracting text from Word (.doc) document")
-                log_area.markdown("\n".join(logs))
-                with uploaded_file:
-                    result = mammoth.extract_raw_text(uploaded_file)
-                    text = result.value
-                    matches = email_pattern.findall(text)
-                    for email in matches:
-                        email_set.add(email)
-            elif file_extension == '.pdf':
-                reader = PyPDF2.PdfReader(uploaded_file)
-                logs.append(f"Extracting text from PDF")
-                log_area.markdown("\n".join(logs))
-                for page_num in range(len(reader.pages)):
-                    page = reader.pages[page_num]
-                    text = page.extract_text()
-                    if text:
-                        matches = email_pattern.findall(text)
-                        for email in matches:
-                            email_set.add(email)
+            futures = submit(executor)
+        except BrokenProcessPool:
+            # Another session's worker died; start over with a fresh pool.
+            _discard_executor(executor)
+            executor = _executor()
+            futures = submit(executor)
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # A worker that dies (native crash, OOM kill) breaks the
+                # pool; report it against this file and keep the others.
+                if isinstance(e, BrokenProcessPool):
+                    _discard_executor(executor)
+                result = (frozenset(),
+                          [f"❌ Error processing file {key[0]}: {e}"], True)
+                record(key, result)
             else:
-                logs.append(f"⚠️ Unsupported file type: {filename}")
-                log_area.markdown("\n".join(logs))
-        except Exception as e:
-            logs.append(f"❌ Error processing file {filename}: {e}")
-            log_area.markdown("\n".join(logs))
-        progress_bar.progress((idx + 1) / total_files)
+                store(key, result)
 
-    return sorted(email_set), logs
+    return sorted(set().union(*found)), list(logs)
 
 def convert_df_to_excel(df):
     output = BytesIO()
@@ -135,9 +184,10 @@ def main():
         else:
             st.warning("Please upload at least one file.")
 
-    # Add a clear/reset button
-    if st.button("Clear"):
-        st.experimental_rerun()
+    # Add a clear/reset button. Clicking any button already reruns the
+    # script, and on that run "Extract Emails" is not pressed, so the
+    # results disappear without an explicit rerun.
+    st.button("Clear")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,120 @@
+import os
+import re
+import pandas as pd
+from io import BytesIO
+from docx import Document
+import pymupdf
+import mammoth
+from python_calamine import CalamineWorkbook
+
+# The lookbehind lets a match start only at the beginning of a run of
+# address characters, which keeps the scan linear on long dotted runs.
+# Leading dots of a run are consumed outside the capture group, so
+# ".john@x.com" still yields "john@x.com"; local parts may not start or end
+# with '.'. re.ASCII keeps \b to ASCII word characters, so an address
+# directly followed by a non-ASCII letter is still found.
+EMAIL_RE = re.compile(
+    r'(?<![A-Za-z0-9._%+-])\.*'
+    r'([A-Za-z0-9_%+-](?:[A-Za-z0-9._%+-]*[A-Za-z0-9_%+-])?'
+    r'@[A-Za-z0-9.-]+\.[A-Za-z]{2,})\b', re.ASCII)
+
+# PyMuPDF text flags for PDF pages: the "text" defaults, except that
+# ligatures are expanded (an "ﬁ" glyph must become "fi" for an address to
+# match) and unusual whitespace is normalised instead of preserved.
+PDF_TEXT_FLAGS = pymupdf.TEXTFLAGS_TEXT & ~(
+    pymupdf.TEXT_PRESERVE_LIGATURES | pymupdf.TEXT_PRESERVE_WHITESPACE)
+
+# Number of PDF pages processed between flushes of MuPDF's resource store.
+PDF_STORE_SHRINK_PAGES = 100
+
+def extract_one(filename, data):
+    """Extract email addresses from the raw bytes of a single file.
+
+    Returns (emails, logs, failed), where failed is True when the file
+    could not be processed.
+
+    Runs in a worker process, so it must not call into Streamlit; log lines
+    are returned to the caller for display instead. It lives outside the
+    Streamlit script so the pool can pickle it by a stable module path.
+    """
+    email_set = set()
+    logs = []
+    failed = False
+    file_extension = os.path.splitext(filename)[1].lower()
+    uploaded_file = BytesIO(data)
+    try:
+        # Text is gathered into one buffer per file and scanned in a single
+        # pass rather than once per cell or paragraph. Chunks without an
+        # '@' cannot contain an address, and a substring check is far
+        # cheaper than running the regex, so they are dropped up front.
+        text = None
+        if file_extension == '.xls':
+            xls = pd.ExcelFile(uploaded_file, engine='xlrd')
+            parts = []
+            for sheet_name in xls.sheet_names:
+                logs.append(f"Reading sheet: {sheet_name}")
+                # header=None so the first row is scanned like the others,
+                # matching the calamine branch.
+                df = pd.read_excel(xls, sheet_name=sheet_name, header=None,
+                                   dtype=str, engine='xlrd')
+                cells = df.to_numpy().ravel()
+                parts.extend(cell for cell in cells[pd.notna(cells)]
+                             if '@' in cell)
+            text = "\n".join(parts)
+        elif file_extension in ['.xlsx', '.xlsm']:
+            # calamine parses the workbook XML in Rust, which is much faster
+            # than openpyxl and skips building a DataFrame per sheet. Rows
+            # are streamed, and numbers, dates and booleans are skipped
+            # since they can never hold an address.
+            workbook = CalamineWorkbook.from_filelike(uploaded_file)
+            parts = []
+            for sheet_name in workbook.sheet_names:
+                logs.append(f"Reading sheet: {sheet_name}")
+                rows = workbook.get_sheet_by_name(sheet_name).iter_rows()
+                parts.extend(cell for row in rows for cell in row
+                             if isinstance(cell, str) and '@' in cell)
+            text = "\n".join(parts)
+        elif file_extension == '.docx':
+            doc = Document(uploaded_file)
+            logs.append(f"Extracting text from Word (.docx) document")
+            parts = [para.text for para in doc.paragraphs]
+            parts.extend(cell.text for table in doc.tables
+                         for row in table.rows for cell in row.cells)
+            text = "\n".join(part for part in parts if '@' in part)
+        elif file_extension == '.doc':
+            logs.append(f"Extracting text from Word (.doc) document")
+            with uploaded_file:
+                result = mammoth.extract_raw_text(uploaded_file)
+                text = result.value
+        elif file_extension == '.pdf':
+            pdf = pymupdf.open(stream=data, filetype="pdf")
+            logs.append(f"Extracting text from PDF")
+            try:
+                parts = []
+                for page_num in range(pdf.page_count):
+                    page = pdf.load_page(page_num)
+                    page_text = page.get_text("text", flags=PDF_TEXT_FLAGS)
+                    # Drop the page before loading the next one, and
+                    # periodically empty MuPDF's font/image store, so huge
+                    # documents do not keep every parsed page resident.
+                    # The store is process-wide; this is only safe because
+                    # extract_one always runs in a single-threaded pool
+                    # worker, never on a Streamlit session thread.
+                    page = None
+                    if '@' in page_text:
+                        parts.append(page_text)
+                    if (page_num + 1) % PDF_STORE_SHRINK_PAGES == 0:
+                        pymupdf.TOOLS.store_shrink(100)
+                text = "\n".join(parts)
+            finally:
+                pdf.close()
+        else:
+            logs.append(f"⚠️ Unsupported file type: {filename}")
+        if text and '@' in text:
+            email_set.update(
+                match.group(1) for match in EMAIL_RE.finditer(text))
+    except Exception as e:
+        logs.append(f"❌ Error processing file {filename}: {e}")
+        failed = True
+
+    return frozenset(email_set), logs, failed